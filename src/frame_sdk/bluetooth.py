@@ -1,5 +1,6 @@
 import asyncio
-from typing import Optional, Callable, List, Tuple, Dict, Any
+import collections
+from typing import Optional, Callable, Deque, List, Tuple, Dict, Any
 from enum import Enum
 from bleak import BleakClient, BleakScanner, BleakError
 
@@ -12,6 +13,7 @@ class FrameDataTypePrefixes(Enum):
     TAP = 0x04
     MIC_DATA = 0x05
     DEBUG_PRINT = 0x06
+    IMU_DATA = 0x07
     LONG_TEXT = 0x0A
     LONG_TEXT_END = 0x0B
 
@@ -33,6 +35,7 @@ class Bluetooth:
     def __init__(self):
         self._btle_client: Optional[BleakClient] = None
         self._tx_characteristic: Optional[Any] = None
+        self._mtu: int = 0
         self._user_disconnect_handler: Callable[[], None] = lambda: None
         
         self._max_receive_buffer: int = 10 * 1024 * 1024
@@ -51,6 +54,9 @@ class Bluetooth:
         self._data_response_event: asyncio.Event = asyncio.Event()
         self._user_data_response_handlers: Dict[FrameDataTypePrefixes, Callable[[bytes], None]] = {}
 
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._rx_queue: Deque[bytearray] = collections.deque()
+        self._rx_scheduled: bool = False
 
     def _disconnect_handler(self, _: Any) -> None:
         """Called internally when the bluetooth connection is lost.  To add your own handler, supply a `disconnect_handler` when connecting.
@@ -59,9 +65,39 @@ class Bluetooth:
         self.__init__()
 
 
-    async def _notification_handler(self, _: Any, data: bytearray) -> None:
+    def _notification_handler(self, _: Any, data: bytearray) -> None:
         """Called internally when a notification is received from the device.  To add your own handlers, call `register_data_response_handler()` and/or `register_print_response_handler()` when connecting.
 
+        Notifications are queued and handled in batches on the event loop, so a burst of packets (such as streamed audio) only schedules a single callback.
+
+        Args:
+            data (bytearray): The data received from the device as raw bytes
+        """
+        # a notification can still arrive after a disconnect has reset the connection state, with no loop to hand it to
+        if self._loop is None:
+            return
+        self._rx_queue.append(data)
+        if not self._rx_scheduled:
+            self._rx_scheduled = True
+            self._loop.call_soon_threadsafe(self._drain_notifications)
+
+    def _drain_notifications(self) -> None:
+        """Called internally on the event loop to handle every notification queued by `_notification_handler()`."""
+        # clear the flag before draining, so a notification queued while we drain schedules another pass rather than being left behind
+        self._rx_scheduled = False
+        while self._rx_queue:
+            data = self._rx_queue.popleft()
+            try:
+                self._process_notification(data)
+            except Exception as e:
+                self._loop.call_exception_handler({
+                    "message": "Error handling notification from Frame",
+                    "exception": e,
+                })
+
+    def _process_notification(self, data: bytearray) -> None:
+        """Called internally to handle a single notification received from the device.
+
         Args:
             data (bytearray): The data received from the device as raw bytes
         """
@@ -72,7 +108,7 @@ class Bluetooth:
                 self._ongoing_print_response_chunk_count = 0
                 if self._print_debugging:
                     print("Starting receiving new long printed string")
-            self._ongoing_print_response += data[1:]
+            self._ongoing_print_response += memoryview(data)[1:]
             self._ongoing_print_response_chunk_count += 1
             if self._print_debugging:
                 print(f"Received chunk #{self._ongoing_print_response_chunk_count}: "+data[1:].decode())
@@ -104,10 +140,11 @@ class Bluetooth:
                 self._last_data_response = None
                 if self._print_debugging:
                     print("Starting receiving new long raw data")
-            self._ongoing_data_response += data[2:]
+            # append through a memoryview so each packet is copied straight into the reassembly buffer without an intermediate slice
+            self._ongoing_data_response += memoryview(data)[2:]
             self._ongoing_data_response_chunk_count += 1
             if self._print_debugging:
-                print(f"Received data chunk #{self._ongoing_data_response_chunk_count}: {len(data[2:])} bytes")
+                print(f"Received data chunk #{self._ongoing_data_response_chunk_count}: {len(data) - 2} bytes")
             if len(self._ongoing_data_response) > self._max_receive_buffer:
                 raise Exception(f"Buffered received long raw data is more than {self._max_receive_buffer} bytes")
             
@@ -135,8 +172,10 @@ class Bluetooth:
             # received single chunk raw data from frame.bluetooth.send(data)
             if self._print_debugging:
                 print(f"Received data: {len(data[1:])} bytes")
-            self._last_data_response = data[1:]
-            self._data_response_event.set()
+            # data that a handler was registered for by its prefix goes only to that handler, so it can't be mistaken for the response wait_for_data() is expecting
+            if not self._has_prefix_handler(data[1:]):
+                self._last_data_response = data[1:]
+                self._data_response_event.set()
             self.call_data_response_handlers(data[1:])
             
         else:
@@ -148,7 +187,7 @@ class Bluetooth:
             self._user_print_response_handler(data.decode())
 
     def register_data_response_handler(self, prefix: FrameDataTypePrefixes = None, handler: Callable[[bytes], None] = None) -> None:
-        """Registers a data response handler which will be called when data is received from the device that starts with the specified prefix."""
+        """Registers a data response handler which will be called when data is received from the device that starts with the specified prefix.  Single packets of data with that prefix are then left out of `wait_for_data()`.  A handler registered with a prefix of None receives all data, without affecting `wait_for_data()`."""
         if handler is None:
             self._user_data_response_handlers.pop(prefix, None)
         else:
@@ -157,6 +196,10 @@ class Bluetooth:
             else:
                 self._user_data_response_handlers[prefix] = handler
             
+    def _has_prefix_handler(self, data: bytes) -> bool:
+        """Returns `True` if a handler is registered for the specific prefix that the received data starts with."""
+        return len(data) > 0 and any(prefix is not None and data[0] == prefix.value for prefix in self._user_data_response_handlers)
+
     def call_data_response_handlers(self, data: bytes) -> None:
         """Calls all data response handlers which match the received data."""
         for prefix, handler in self._user_data_response_handlers.items():
@@ -194,6 +237,7 @@ class Bluetooth:
         """
         self._print_debugging = print_debugging
         self._default_timeout = default_timeout
+        self._loop = asyncio.get_running_loop()
 
         # returns list of (BLEDevice, AdvertisementData)
         devices: Dict[str, Tuple[Any, Any]] = await BleakScanner.discover(3, return_adv=True)
@@ -238,6 +282,12 @@ class Bluetooth:
         if client_name == "BleakClientBlueZDBus":
             await self._btle_client._backend._acquire_mtu()
 
+        # the other backends negotiate the MTU as part of connecting, so by now every backend reports the final value.
+        # cache it so the payload limits don't have to go back through bleak on every send
+        self._mtu = self._btle_client.mtu_size
+        if self._print_debugging:
+            print(f"Negotiated MTU: {self._mtu}")
+
     async def disconnect(self) -> None:
         """
         Disconnects from the device.
@@ -258,19 +308,17 @@ class Bluetooth:
         """
         Returns the maximum length of a Lua string which may be transmitted.  This is equal to the MTU - 3.
         """
-        try:
-            return self._btle_client.mtu_size - 3
-        except AttributeError:
+        if self._mtu == 0:
             return 0
+        return self._mtu - 3
 
     def max_data_payload(self) -> int:
         """
         Returns the maximum length of a raw bytearray which may be transmitted.  This is equal to the MTU - 4 (since data is prefixed with a 1 byte header).
         """
-        try:
-            return self._btle_client.mtu_size - 4
-        except AttributeError:
+        if self._mtu == 0:
             return 0
+        return self._mtu - 4
     
     @property
     def default_timeout(self) -> float:
@@ -315,13 +363,17 @@ class Bluetooth:
             data (bytearray): The data to send to the device as raw bytes
 
         Raises:
-            Exception: If the payload length is too large
+            Exception: If not connected, or if the payload length is too large
         """
         if self._print_debugging:
             print(data)  # TODO make this print nicer
 
-        if len(data) > self._btle_client.mtu_size - 3:
-            raise Exception(f"Payload length is too large: {len(data)} > {self._btle_client.mtu_size - 3}")
+        # the mtu is only known while connected, and is reset to 0 on disconnect
+        if self._mtu == 0:
+            raise Exception("Not connected to Frame")
+
+        if len(data) > self._mtu - 3:
+            raise Exception(f"Payload length is too large: {len(data)} > {self._mtu - 3}")
 
         await self._btle_client.write_gatt_char(self._tx_characteristic, data)
 
@@ -351,6 +403,40 @@ class Bluetooth:
         if await_print:
             return await self.wait_for_print(timeout)
         
+    async def send_lua_batch(self, scripts: List[str], await_print: bool = False, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Sends several short Lua strings to the device, joining as many as will fit into each write with `;` so that they go out in as few packets as possible.  Each individual string must be less than or equal to `max_lua_payload()`.
+        
+        If `await_print=True`, the function will block until a Lua print() occurs after the final packet is sent, or a timeout.  Only the last string should print in this case.
+
+        Args:
+            scripts (List[str]): The Lua strings to send, in order.
+            await_print (bool): Whether to block while waiting for a print response.
+            timeout (Optional[float]): The timeout for waiting for a print response.  If not provided, the default timeout will be used.
+
+        Returns:
+            Optional[str]: The print response if `await_print` is True, otherwise None.
+        
+        Raises:
+            Exception: If any single string is too long to fit in one packet
+        """
+        max_payload = self.max_lua_payload()
+        batch: Optional[str] = None
+        for script in scripts:
+            if len(script) > max_payload:
+                raise Exception(f"Payload length is too large: {len(script)} > {max_payload}")
+            if batch is None:
+                batch = script
+            elif len(batch) + 1 + len(script) <= max_payload:
+                batch += ";" + script
+            else:
+                await self._transmit(batch.encode())
+                batch = script
+
+        if batch is None:
+            return None
+        return await self.send_lua(batch, await_print=await_print, timeout=timeout)
+
     async def wait_for_print(self, timeout: Optional[float] = None) -> str:
         """
         Waits until a Lua print() occurs, with a max timeout in seconds.  If `timeout` is not provided, the default timeout will be used, rather than no timeout at all.
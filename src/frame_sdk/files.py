@@ -5,6 +5,21 @@ from typing import Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from .frame import Frame
 
+# Lua snippets used on every file write, formatted with the path where needed
+_OPEN_WRITE_TMPL = 'w=frame.file.open("{}","write")'
+_OPEN_WRITE_CHECKED_TMPL = _OPEN_WRITE_TMPL + ';print("o")'
+_RECEIVE_CALLBACK_WRITE = 'frame.bluetooth.receive_callback((function(d)w:write(d)end))'
+_RECEIVE_CALLBACK_WRITE_CHECKED = _RECEIVE_CALLBACK_WRITE + ';print("c")'
+_CLOSE_WRITE = 'w:close();print("c")'
+_RECEIVE_CALLBACK_CLEAR = 'frame.bluetooth.receive_callback(nil)'
+_RECEIVE_CALLBACK_CLEAR_CHECKED = _RECEIVE_CALLBACK_CLEAR + ';print("c")'
+# uses frame.file.stat() where the firmware has it so no file handle is opened, otherwise a protected open so a missing file isn't a Lua error
+_FILE_EXISTS_TMPL = 'local s=frame.file.stat;local o,r=pcall(s or frame.file.open,"{}","read");if o and not s then r:close()end;print(o and r~=nil)'
+# shorter fallback for paths too long to fit the above in one packet, which prints "o" only if the file opens
+_FILE_EXISTS_SHORT_TMPL = 'r=frame.file.open("{}","read");print("o");r:close()'
+_DELETE_TMPL = 'frame.file.remove("{}");print("d")'
+_READ_TMPL = 'printCompleteFile("{}")'
+
 class Files:
     """Helpers for accessing the Frame filesystem."""
     
@@ -32,39 +47,36 @@ class Files:
             Exception: If the file cannot be opened, written to, or closed.
         """
         response = await self.frame.bluetooth.send_lua(
-            f"w=frame.file.open(\"{path}\",\"write\")" +
-            (";print(\"o\")" if checked else ""), await_print=checked)
+            (_OPEN_WRITE_CHECKED_TMPL if checked else _OPEN_WRITE_TMPL).format(path), await_print=checked)
         if checked and response != "o":
             raise Exception(f"Couldn't open file \"{path}\" for writing: {response}")
         response = await self.frame.bluetooth.send_lua(
-            f"frame.bluetooth.receive_callback((function(d)w:write(d)end))" +
-            (";print(\"c\")" if checked else ""), await_print=checked)
+            _RECEIVE_CALLBACK_WRITE_CHECKED if checked else _RECEIVE_CALLBACK_WRITE, await_print=checked)
         if checked and response != "c":
             raise Exception(f"Couldn't register callback for writing to file \"{path}\": {response}")
         
+        max_payload = self.frame.bluetooth.max_data_payload()-1
+        if max_payload <= 0 and len(data) > 0:
+            raise Exception("MTU too small to write file, or escape character at end of chunk")
+        
+        # slice through a memoryview so each chunk is sent without copying it out of data first
+        data_view = memoryview(data)
         current_index = 0
-        while current_index < len(data):
-            max_payload = self.frame.bluetooth.max_data_payload()-1
-            next_chunk_length = min(len(data) - current_index, max_payload)
-            if next_chunk_length == 0:
-                break
-            
-            if next_chunk_length <= 0:
-                raise Exception("MTU too small to write file, or escape character at end of chunk")
-            
-            chunk = data[current_index:current_index + next_chunk_length]
-            await self.frame.bluetooth.send_data(chunk)
+        remaining = len(data)
+        while remaining:
+            next_chunk_length = remaining if remaining < max_payload else max_payload
+            await self.frame.bluetooth.send_data(data_view[current_index:current_index + next_chunk_length])
             
             current_index += next_chunk_length
-            if current_index < len(data):
+            remaining -= next_chunk_length
+            if remaining:
                 await asyncio.sleep(0.1)
             
-        response = await self.frame.bluetooth.send_lua("w:close();print(\"c\")", await_print=checked)
+        response = await self.frame.bluetooth.send_lua(_CLOSE_WRITE, await_print=checked)
         if checked and response != "c":
             raise Exception("Error closing file")
         response = await self.frame.bluetooth.send_lua(
-            f"frame.bluetooth.receive_callback(nil)" +
-            (";print(\"c\")" if checked else ""), await_print=checked)
+            _RECEIVE_CALLBACK_CLEAR_CHECKED if checked else _RECEIVE_CALLBACK_CLEAR, await_print=checked)
         if checked and response != "c":
             raise Exception(f"Couldn't remove callback for writing to file \"{path}\"")
         
@@ -78,9 +90,12 @@ class Files:
         Returns:
             bool: True if the file exists, False otherwise.
         """
-        response_from_opening = await self.frame.bluetooth.send_lua(
-            f"r=frame.file.open(\"{path}\",\"read\");print(\"o\");r:close()", await_print=True)
-        return response_from_opening == "o"
+        lua = _FILE_EXISTS_TMPL.format(path)
+        if len(lua) > self.frame.bluetooth.max_lua_payload():
+            response = await self.frame.bluetooth.send_lua(_FILE_EXISTS_SHORT_TMPL.format(path), await_print=True)
+            return response == "o"
+        response = await self.frame.bluetooth.send_lua(lua, await_print=True)
+        return response == "true"
     
     async def delete_file(self, path: str) -> bool:
         """
@@ -92,7 +107,7 @@ class Files:
         Returns:
             bool: True if the file was deleted, False if it didn't exist or failed to delete.
         """
-        response = await self.frame.bluetooth.send_lua(f"frame.file.remove(\"{path}\");print(\"d\")", await_print=True)
+        response = await self.frame.bluetooth.send_lua(_DELETE_TMPL.format(path), await_print=True)
         return response == "d"
     
     async def read_file(self, path: str) -> bytes:
@@ -108,6 +123,6 @@ class Files:
         Raises:
             Exception: If the file does not exist.
         """
-        await self.frame.run_lua(f"printCompleteFile(\"{path}\")")
+        await self.frame.run_lua(_READ_TMPL.format(path))
         result: bytes = await self.frame.bluetooth.wait_for_data()
         return result.strip()
\ No newline at end of file
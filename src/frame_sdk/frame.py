@@ -1,5 +1,4 @@
 import asyncio
-import hashlib
 from typing import Awaitable, Callable, Optional
 from .bluetooth import Bluetooth, FrameDataTypePrefixes
 from .files import Files
@@ -7,10 +6,20 @@ from .camera import Camera
 from .display import Display
 from .microphone import Microphone
 from .motion import Motion
-import random
 import re
 import time
 
+_PRINT_CALL_RE = re.compile(r'\bprint\(')
+_CHECKED_SUFFIX = ';print("+")'
+
+# Lua snippets reused on every connect or wake setup, formatted with names where needed
+_MKDIR_TMPL = 'pcall(frame.file.mkdir,"{}")'
+_REQUIRE_TMPL = 'require("{}")'
+_REQUIRE_CHECKED_TMPL = _REQUIRE_TMPL + ";print('done')"
+_REQUIRE_LIB_TMPL = 'require("lib-{}/{}");print("l")'
+_LIBRARY_VERSION_CHECK_TMPL = 'print(tostring(frame_sdk_library_version=="{}"))'
+_WAKE_SEND = "frame.bluetooth.send('\\x" + FrameDataTypePrefixes.WAKE.value_as_hex + "')"
+
 class Frame:
     """Represents a Frame device. Instantiate this class via `async with Frame() as f:`."""
     
@@ -26,6 +35,8 @@ class Frame:
         self.motion = Motion(self)
         self._lua_on_wake = None
         self._callback_on_wake = None
+        # seeded from the clock so names don't repeat across sessions, since the Lua VM (and its require() cache) outlives a connection
+        self._long_lua_seq = int(time.time())
         
     async def __aenter__(self) -> 'Frame':
         """Enter the asynchronous context manager."""
@@ -76,18 +87,17 @@ class Frame:
         await self.ensure_connected()
         # replace any print() calls with prntLng() calls
         # TODO: this is a dirty hack and instead we should fix the implementation of print() in the Frame
-        lua_string = re.sub(r'\bprint\(', 'prntLng(', lua_string)
+        lua_string = _PRINT_CALL_RE.sub('prntLng(', lua_string)
         
-        if len(lua_string) <= self.bluetooth.max_lua_payload():
-            if checked and not await_print:
-                lua_string += ";print(\"+\")"
-                if len(lua_string) <= self.bluetooth.max_lua_payload():
-                    result = await self.bluetooth.send_lua(lua_string, await_print=True, timeout=timeout)
-                    if result != "+":
-                        raise Exception(f"Lua did not run successfully: {result}")
-                    return None
-            else:
-                return await self.bluetooth.send_lua(lua_string, await_print=await_print, timeout=timeout)
+        max_payload = self.bluetooth.max_lua_payload()
+        if checked and not await_print:
+            if len(lua_string) <= max_payload - len(_CHECKED_SUFFIX):
+                result = await self.bluetooth.send_lua(lua_string + _CHECKED_SUFFIX, await_print=True, timeout=timeout)
+                if result != "+":
+                    raise Exception(f"Lua did not run successfully: {result}")
+                return None
+        elif len(lua_string) <= max_payload:
+            return await self.bluetooth.send_lua(lua_string, await_print=await_print, timeout=timeout)
         
         return await self.send_long_lua(lua_string, await_print=await_print, checked=checked, timeout=timeout)
 
@@ -109,20 +119,21 @@ class Frame:
         """
         await self.ensure_connected()
         
-        # we use a random name here since require() only works once per file.
-        # TODO: confirm that the Frame implementation of Lua actually works this way.  If not, we don't need to randomize the name.
-        random_name = ''.join(chr(ord('a')+random.randint(0,25)) for _ in range(4))
+        # we use a unique name here since require() only works once per file.
+        # TODO: confirm that the Frame implementation of Lua actually works this way.  If not, we don't need a unique name.
+        self._long_lua_seq += 1
+        random_name = format(self._long_lua_seq, 'x')
         
         await self.files.write_file(f"/{random_name}.lua", string.encode(), checked=True)
         if await_print:
-            response = await self.bluetooth.send_lua(f"require(\"{random_name}\")", await_print=True, timeout=timeout)
+            response = await self.bluetooth.send_lua(_REQUIRE_TMPL.format(random_name), await_print=True, timeout=timeout)
         elif checked:
-            response = await self.bluetooth.send_lua(f"require(\"{random_name}\");print('done')", await_print=True, timeout=timeout)
+            response = await self.bluetooth.send_lua(_REQUIRE_CHECKED_TMPL.format(random_name), await_print=True, timeout=timeout)
             if response != "done":
                 raise Exception(f"require() did not return 'done': {response}")
             response = None
         else:
-            response = await self.bluetooth.send_lua(f"require(\"{random_name}\")")
+            response = await self.bluetooth.send_lua(_REQUIRE_TMPL.format(random_name))
         await self.files.delete_file(f"/{random_name}.lua")
         return response
     
@@ -160,7 +171,7 @@ class Frame:
             if self._lua_on_wake is not None or self._callback_on_wake is not None:
                 run_on_wake = self._lua_on_wake or ""
                 if self._callback_on_wake is not None:
-                    run_on_wake = "frame.bluetooth.send('\\x"+FrameDataTypePrefixes.WAKE.value_as_hex+"');"+run_on_wake
+                    run_on_wake = _WAKE_SEND + ";" + run_on_wake
                 run_on_wake = "if not is_awake then;is_awake=true;"+run_on_wake+";end"
                 await self.motion.run_on_tap(run_on_wake)
             await self.run_lua("frame.display.text(' ',1,1);frame.display.show();frame.camera.sleep()", checked=True)
@@ -192,43 +203,57 @@ class Frame:
         if (self.bluetooth._print_debugging):
             print(f"Function {name} exists: {exists}")
         if (exists != "true"):
-            # function does not yet exist, so let's see if the file for it does
-            exists = await self.files.file_exists(f"/lib-{version}/{name}.lua")
-            if (self.bluetooth._print_debugging):
-                print(f"File /lib-{version}/{name}.lua exists: {exists}")
+            await self._load_library_function(name, function.encode(), version)
 
-            if (exists):
-                response = await self.bluetooth.send_lua(f"require(\"lib-{version}/{name}\");print(\"l\")", await_print=True)
-                if response == "l":
-                    return
-            
-            if (self.bluetooth._print_debugging):
-                print(f"Writing file /lib-{version}/{name}.lua")
-            await self.files.write_file(f"/lib-{version}/{name}.lua", function.encode(), checked=True)
-            
-            if (self.bluetooth._print_debugging):
-                print(f"Requiring lib-{version}/{name}")
-            response = await self.bluetooth.send_lua(f"require(\"lib-{version}/{name}\");print(\"l\")", await_print=True)
-            if response != "l":
-                raise Exception(f"Error injecting library function: {response}")
+    async def _load_library_function(self, name: str, function: bytes, version: int) -> None:
+        """
+        Load a library function that isn't yet in the global environment, requiring the existing file for it or writing it first if needed.
+        
+        Args:
+            name (str): The name of the function.
+            function (bytes): The function code, already encoded.
+            version (int): The version of the function.
+        """
+        # function does not yet exist, so let's see if the file for it does
+        exists = await self.files.file_exists(f"/lib-{version}/{name}.lua")
+        if (self.bluetooth._print_debugging):
+            print(f"File /lib-{version}/{name}.lua exists: {exists}")
+
+        if (exists):
+            response = await self.bluetooth.send_lua(_REQUIRE_LIB_TMPL.format(version, name), await_print=True)
+            if response == "l":
+                return
+        
+        if (self.bluetooth._print_debugging):
+            print(f"Writing file /lib-{version}/{name}.lua")
+        await self.files.write_file(f"/lib-{version}/{name}.lua", function, checked=True)
+        
+        if (self.bluetooth._print_debugging):
+            print(f"Requiring lib-{version}/{name}")
+        response = await self.bluetooth.send_lua(_REQUIRE_LIB_TMPL.format(version, name), await_print=True)
+        if response != "l":
+            raise Exception(f"Error injecting library function: {response}")
             
     async def inject_all_library_functions(self) -> None:
         """
         Inject all library functions into the global environment of the device.
         """
-        from .library_functions import library_print_long
-        # hash the library_print_long function to get a version id (take only the first 6 chars)
-        library_version = hashlib.sha256(library_print_long.encode()).hexdigest()[:6]
+        from .library_functions import library_print_long_bytes, library_version
         
         await self.ensure_connected()
-        response = await self.bluetooth.send_lua(f"frame.file.mkdir(\"lib-{library_version}\");print(\"c\")", await_print=True)
-        if response == "c":
-            if (self.bluetooth._print_debugging):
-                print("Created lib directory")
-        else:
-            if (self.bluetooth._print_debugging):
-                print("Did not create lib directory: "+response)
-        await self.inject_library_function("prntLng", library_print_long, library_version)
+        library_functions = [("prntLng", library_print_long_bytes)]
+        # create the lib directory and check which library version is loaded in a single batch, rather than one round trip for each.
+        # the Lua state survives reconnects, so checking the version (rather than that the functions exist) catches an older library left running.
+        # the uploads themselves stay sequential, since they share the Frame's file handle, receive callback and print channel
+        up_to_date = await self.bluetooth.send_lua_batch([
+            _MKDIR_TMPL.format("lib-" + library_version),
+            _LIBRARY_VERSION_CHECK_TMPL.format(library_version),
+        ], await_print=True)
+        if (self.bluetooth._print_debugging):
+            print(f"Library version {library_version} loaded: {up_to_date}")
+        if up_to_date != "true":
+            for name, function in library_functions:
+                await self._load_library_function(name, function, library_version)
         
     
     def escape_lua_string(self, string: str) -> str:
@@ -255,9 +280,9 @@ class Frame:
             self.bluetooth.register_data_response_handler(FrameDataTypePrefixes.WAKE, None)
         
         if lua_script is not None and callback is not None:
-            await self.files.write_file("main.lua",("is_awake=true;frame.bluetooth.send('\\x"+FrameDataTypePrefixes.WAKE.value_as_hex+"');\n"+lua_script).encode(), checked=True)
+            await self.files.write_file("main.lua",("is_awake=true;" + _WAKE_SEND + ";\n" + lua_script).encode(), checked=True)
         elif lua_script is None and callback is not None:
-            await self.files.write_file("main.lua",("is_awake=true;frame.bluetooth.send('\\x"+FrameDataTypePrefixes.WAKE.value_as_hex+"')").encode(), checked=True)
+            await self.files.write_file("main.lua",("is_awake=true;" + _WAKE_SEND).encode(), checked=True)
         elif lua_script is not None and callback is None:
             await self.files.write_file("main.lua",("is_awake=true;"+lua_script).encode(), checked=True)
         else:
@@ -1,7 +1,9 @@
+import hashlib
+
 from .bluetooth import FrameDataTypePrefixes
 
 # these are some helper functions that we run on the Frame.  The SDK will not work well if these do not exist.  Every time you connect to a Frame, the SDK will automatically inject these functions into the Frame.
-library_print_long = """
+library_print_long = "".join(["""
 function prntLng(stringToPrint)
     local mtu = frame.bluetooth.max_length()
     local len = string.len(stringToPrint)
@@ -17,11 +19,25 @@ function prntLng(stringToPrint)
             j = len
         end
         local chunk = string.sub(stringToPrint, i, j)
-        print('\\x"""+FrameDataTypePrefixes.LONG_TEXT.value_as_hex+"""'..chunk)
+        print('\\x""", FrameDataTypePrefixes.LONG_TEXT.value_as_hex, """'..chunk)
         chunkIndex = chunkIndex + 1
         i = j + 1
     end
-    print('\\x"""+FrameDataTypePrefixes.LONG_TEXT_END.value_as_hex+"""'..chunkIndex)
+    print('\\x""", FrameDataTypePrefixes.LONG_TEXT_END.value_as_hex, """'..chunkIndex)
+end
+function sendWithBackoff(dataToSend, max_attempts)
+    -- wait a little longer after each failed send so the bluetooth stack can drain, rather than spinning the CPU.
+    -- with max_attempts the data is dropped (and counted) once it runs out of attempts, otherwise it is retried until it goes
+    local attempt = 0
+    while not pcall(frame.bluetooth.send, dataToSend) do
+        attempt = attempt + 1
+        if max_attempts ~= nil and attempt > max_attempts then
+            dropped_packet_count = (dropped_packet_count or 0) + 1
+            return false
+        end
+        frame.sleep(0.001 * math.min(attempt, 8))
+    end
+    return true
 end
 function sendPartial(dataToSend, max_size)
     local len = string.len(dataToSend)
@@ -33,11 +49,7 @@ function sendPartial(dataToSend, max_size)
             j = len
         end
         local chunk = string.sub(dataToSend, i, j)
-        while true do
-            if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA.value_as_hex+"""' .. chunk) then
-                break
-            end
-        end
+        sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA.value_as_hex, """' .. chunk)
         chunkIndex = chunkIndex + 1
         i = j + 1
     end
@@ -45,44 +57,44 @@ function sendPartial(dataToSend, max_size)
 end
 function printCompleteFile(filename)
     local mtu = frame.bluetooth.max_length()
+    local packet_size = mtu - 4
     local f = frame.file.open(filename, "read")
     local chunkIndex = 0
-    local chunk = ""
+    -- collect lines in a table and join them only once there's a full packet, rather than growing one string with every line
+    local parts = {}
+    local parts_len = 0
     while true do
         local new_chunk = f:read()
         if new_chunk == nil then
-            if string.len(chunk) > 0 then
-                chunkIndex = chunkIndex + sendPartial(chunk, mtu)
-                break
+            if parts_len > 0 then
+                chunkIndex = chunkIndex + sendPartial(table.concat(parts), mtu)
             end
             break
         end
-        if string.len(new_chunk) == 512 then
-            chunk = chunk .. new_chunk
-        else
-            chunk = chunk .. new_chunk .. "\\n"
-        end
-        
-        while string.len(chunk) > mtu - 4 do
-            local chunk_to_send = string.sub(chunk, 1, mtu - 4)
-            chunkIndex = chunkIndex + 1
-            chunk = string.sub(chunk, mtu - 3)
-            while true do
-                if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA.value_as_hex+"""' .. chunk_to_send) then
-                    break
-                end
-            end
+        parts[#parts + 1] = new_chunk
+        parts_len = parts_len + string.len(new_chunk)
+        if string.len(new_chunk) ~= 512 then
+            parts[#parts + 1] = "\\n"
+            parts_len = parts_len + 1
         end
-    end
-    while true do
-        if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA_END.value_as_hex+"""' .. chunkIndex) then
-            break
+
+        if parts_len > packet_size then
+            local chunk = table.concat(parts)
+            local i = 1
+            while parts_len - i + 1 > packet_size do
+                local chunk_to_send = string.sub(chunk, i, i + packet_size - 1)
+                chunkIndex = chunkIndex + 1
+                i = i + packet_size
+                sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA.value_as_hex, """' .. chunk_to_send)
+            end
+            parts = { string.sub(chunk, i) }
+            parts_len = parts_len - i + 1
         end
     end
+    sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA_END.value_as_hex, """' .. chunkIndex)
     f:close()
 end
 function cameraCaptureAndSend(quality,autoExpTimeDelay,autofocusType)
-    local last_autoexp_time = 0
     local state = 'EXPOSING'
     local state_time = frame.time.utc()
     local chunkIndex = 0
@@ -92,39 +104,32 @@ function cameraCaptureAndSend(quality,autoExpTimeDelay,autofocusType)
 
     while true do
         if state == 'EXPOSING' then
-            if frame.time.utc() - last_autoexp_time > 0.1 then
-                frame.camera.auto { metering = autofocusType }
-                last_autoexp_time = frame.time.utc()
-            end
+            frame.camera.auto { metering = autofocusType }
             if frame.time.utc() > state_time + autoExpTimeDelay then
                 state = 'CAPTURE'
+            else
+                frame.sleep(0.1)
             end
         elseif state == 'CAPTURE' then
             frame.camera.capture { quality_factor = quality }
             state_time = frame.time.utc()
             state = 'WAIT'
         elseif state == 'WAIT' then
-            if frame.time.utc() > state_time + 0.5 then
-                state = 'SEND'
+            local remaining = state_time + 0.5 - frame.time.utc()
+            if remaining > 0 then
+                frame.sleep(remaining)
             end
+            state = 'SEND'
         elseif state == 'SEND' then
             local i = frame.camera.read(frame.bluetooth.max_length() - 1)
             if (i == nil) then
                 state = 'DONE'
             else
-                while true do
-                    if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA.value_as_hex+"""' .. i) then
-                        break
-                    end
-                end
+                sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA.value_as_hex, """' .. i)
                 chunkIndex = chunkIndex + 1
             end
         elseif state == 'DONE' then
-            while true do
-                if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA_END.value_as_hex+"""' .. chunkIndex) then
-                    break
-                end
-            end
+            sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA_END.value_as_hex, """' .. chunkIndex)
             break
         end
     end
@@ -167,16 +172,50 @@ function scrollText(text, line_height, total_height, lines_per_frame, delay, tex
         drawRect(1, 1, 640, line_height, 15)
         drawRect(1, 400 - line_height, 640, line_height, 15)
         frame.display.show()
-        while frame.time.utc() - start_time < delay do
+        local remaining = delay - (frame.time.utc() - start_time)
+        if remaining > 0 then
+            frame.sleep(remaining)
         end
         i = i + lines_per_frame
     end
-    local extra_time = frame.time.utc() + (1 * line_height / lines_per_frame * delay)
-    while frame.time.utc() < extra_time do
+    frame.sleep(1 * line_height / lines_per_frame * delay)
+end
+
+-- exponent segment for each value of the top byte of a biased 15-bit magnitude, used for mu-law encoding
+local mulaw_exponent = {}
+for i = 0, 255 do
+    local exponent = 0
+    local v = i >> 1
+    while v > 0 do
+        exponent = exponent + 1
+        v = v >> 1
     end
+    mulaw_exponent[i] = exponent
 end
 
-function microphoneRecordAndSend(sample_rate, bit_depth, max_time_in_seconds)
+function mulawEncode(pcm)
+    local samples = { string.unpack('<' .. string.rep('i2', #pcm // 2), pcm) }
+    -- string.unpack also returns the position after the last value read
+    samples[#samples] = nil
+    for i = 1, #samples do
+        local sample = samples[i]
+        local sign = 0
+        if sample < 0 then
+            sign = 0x80
+            sample = -sample
+        end
+        if sample > 32635 then
+            sample = 32635
+        end
+        sample = sample + 0x84
+        local exponent = mulaw_exponent[(sample >> 7) & 0xFF]
+        local mantissa = (sample >> (exponent + 3)) & 0x0F
+        samples[i] = ~(sign | (exponent << 4) | mantissa) & 0xFF
+    end
+    return string.char(table.unpack(samples))
+end
+
+function microphoneRecordAndSend(sample_rate, bit_depth, max_time_in_seconds, use_mulaw)
     frame.microphone.start{sample_rate=sample_rate, bit_depth=bit_depth}
     local end_time = frame.time.utc() + 60 * 60 * 24
     local max_packet_size = frame.bluetooth.max_length() - 4
@@ -184,34 +223,81 @@ function microphoneRecordAndSend(sample_rate, bit_depth, max_time_in_seconds)
         end_time = frame.time.utc() + max_time_in_seconds
     end
     local chunk_count = 0
+    dropped_packet_count = 0
 
     if max_packet_size % 2 ~= 0 then
         max_packet_size = max_packet_size - 1
     end
 
+    -- mu-law packs each 16-bit sample into a single byte, so twice as much audio fits in each packet
+    local read_size = max_packet_size
+    if use_mulaw then
+        read_size = max_packet_size * 2
+    end
+
+    -- audio read while bluetooth is busy waits in this queue rather than holding up the next microphone read.
+    -- if the queue fills up, the oldest packet is dropped
+    local pending = {}
+    local pending_first = 1
+    local pending_last = 0
+    local max_pending = 8
+
+    -- a timed recording is sent as one long data response, otherwise each packet is streamed as mic data.
+    -- that doesn't change during the recording, so pick the prefix once rather than for every packet
+    local prefix = '\\x""", FrameDataTypePrefixes.MIC_DATA.value_as_hex, """'
+    if max_time_in_seconds ~= nil then
+        prefix = '\\x""", FrameDataTypePrefixes.LONG_DATA.value_as_hex, """'
+    end
+
+    local function sendNextPending()
+        local sent = pcall(frame.bluetooth.send, prefix .. pending[pending_first])
+        if sent then
+            pending[pending_first] = nil
+            pending_first = pending_first + 1
+            chunk_count = chunk_count + 1
+        end
+        return sent
+    end
+
     while frame.time.utc() < end_time do
-        s = frame.microphone.read(max_packet_size)
+        local s = frame.microphone.read(read_size)
         if s == nil then
             break
         end
         if s ~= '' then
-            while true do
-                if max_time_in_seconds ~= nil then
-                    if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.LONG_DATA.value_as_hex+"""' .. s) then
-                        break
-                    end
-                else
-                    if pcall(frame.bluetooth.send, '\\x"""+FrameDataTypePrefixes.MIC_DATA.value_as_hex+"""' .. s) then
-                        break
-                    end
-                end
+            if use_mulaw then
+                s = mulawEncode(s)
+            end
+            if pending_last - pending_first + 1 >= max_pending then
+                pending[pending_first] = nil
+                pending_first = pending_first + 1
+                dropped_packet_count = (dropped_packet_count or 0) + 1
             end
+            pending_last = pending_last + 1
+            pending[pending_last] = s
+        end
+        -- send whatever bluetooth will take right now, then go straight back to reading the microphone
+        while pending_first <= pending_last and sendNextPending() do
+        end
+    end
+
+    -- flush anything still queued, backing off while bluetooth drains. a packet that still can't be sent is dropped
+    while pending_first <= pending_last do
+        if sendWithBackoff(prefix .. pending[pending_first], 8) then
             chunk_count = chunk_count + 1
         end
+        pending[pending_first] = nil
+        pending_first = pending_first + 1
     end
     if max_time_in_seconds ~= nil then
-        frame.bluetooth.send('\\x"""+FrameDataTypePrefixes.LONG_DATA_END.value_as_hex+"""' .. tostring(chunk_count))
+        sendWithBackoff('\\x""", FrameDataTypePrefixes.LONG_DATA_END.value_as_hex, """' .. tostring(chunk_count))
     end
     frame.microphone.stop()
 end
-"""
\ No newline at end of file
+"""])
+
+# encoded and hashed once at import, since the same library is injected on every connection.
+# the hash (first 6 chars) is the library's version id, which names the directory it's stored in on the Frame.
+# the library also records its version in a global, so a Frame still running an older library can be told apart and reloaded
+library_version = hashlib.sha256(library_print_long.encode("ascii")).hexdigest()[:6]
+library_print_long_bytes = (library_print_long + 'frame_sdk_library_version="' + library_version + '"\n').encode("ascii")
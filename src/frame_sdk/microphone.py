@@ -1,9 +1,10 @@
 from __future__ import annotations
-from typing import Optional, TYPE_CHECKING
+from typing import Callable, Optional, TYPE_CHECKING, Tuple, Union
 from datetime import datetime
 import numpy as np
 import asyncio
 import simpleaudio
+import tempfile
 import time
 import wave
 
@@ -12,11 +13,96 @@ from .bluetooth import FrameDataTypePrefixes
 if TYPE_CHECKING:
     from .frame import Frame
 
+# used to scale each packet's amplitude to (0, 1) for silence detection with a multiply rather than a divide
+_INVERSE_INT8_MAX = 1.0 / np.iinfo(np.int8).max
+_INVERSE_INT16_MAX = 1.0 / np.iinfo(np.int16).max
+
+# number of samples save_audio_file() normalizes and writes at a time
+_SAVE_BLOCK_SAMPLES = 64 * 1024
+
+def _peak_amplitude(audio_data: np.ndarray) -> int:
+    """
+    Get the largest absolute sample value, without the wrap-around np.abs() has on the most negative int8 or int16 value.
+
+    Args:
+        audio_data (np.ndarray): The audio data to measure.
+
+    Returns:
+        int: The peak amplitude.
+    """
+    return max(int(audio_data.max()), -int(audio_data.min()))
+
+def _build_mulaw_decode_table() -> np.ndarray:
+    """
+    Build the table that maps each mu-law byte, as sent by `mulawEncode()` on the Frame, back to a 16-bit sample.
+
+    Returns:
+        np.ndarray: 256 int16 samples, indexed by mu-law byte.
+    """
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+
+_MULAW_DECODE_TABLE = _build_mulaw_decode_table()
+
+def _silence_step_numpy(audio_data: np.ndarray, noise_floor: float, inverse_full_scale: float, threshold: float) -> Tuple[float, bool]:
+    """
+    Update the noise floor with one packet of audio and decide whether the packet is louder than silence.
+
+    Args:
+        audio_data (np.ndarray): The packet of audio data.
+        noise_floor (float): The current noise floor, scaled to (0, 1).
+        inverse_full_scale (float): One over the largest sample value for the bit depth.
+        threshold (float): How far above the noise floor counts as sound.
+
+    Returns:
+        Tuple[float, bool]: The new noise floor, and whether the packet contains sound.
+    """
+    # an empty packet carries nothing to measure, so leave the noise floor as it is
+    if len(audio_data) == 0:
+        return noise_floor, False
+    # np.ptp() would wrap around in int16, so take the max and min separately and subtract as Python ints
+    delta = (int(audio_data.max()) - int(audio_data.min())) * inverse_full_scale
+    noise_floor = noise_floor + (delta - noise_floor) * 0.1
+    return noise_floor, delta - noise_floor > threshold
+
+try:
+    from numba import njit, types
+except ImportError:
+    _silence_step = _silence_step_numpy
+else:
+    def _silence_step_loop(audio_data: np.ndarray, noise_floor: float, inverse_full_scale: float, threshold: float) -> Tuple[float, bool]:
+        if len(audio_data) == 0:
+            return noise_floor, False
+        lo = hi = int(audio_data[0])
+        for i in range(1, len(audio_data)):
+            v = int(audio_data[i])
+            if v < lo:
+                lo = v
+            elif v > hi:
+                hi = v
+        delta = (hi - lo) * inverse_full_scale
+        noise_floor = noise_floor + (delta - noise_floor) * 0.1
+        return noise_floor, delta - noise_floor > threshold
+
+    # with numba installed (`pip3 install frame-sdk[speedups]`) the same step is compiled, which saves numpy's per-call overhead on these small packets.
+    # giving the signatures compiles it here at import, rather than on the first packet of a recording.
+    # packets decoded straight from the received bytes with np.frombuffer() are readonly, so those array types are compiled too,
+    # and contiguous arrays get their own signatures so they match one exactly rather than being ambiguous between the others
+    _silence_step = njit([
+        types.Tuple((types.float64, types.boolean))(types.Array(sample_type, 1, layout, readonly=readonly), types.float64, types.float64, types.float64)
+        for sample_type in (types.int8, types.int16)
+        for layout in ("C", "A")
+        for readonly in (False, True)
+    ], cache=True)(_silence_step_loop)
+
 class Microphone:
     """Record and play audio using the Frame microphone."""
 
     frame: "Frame" = None
-    _audio_buffer: Optional[np.ndarray] = None
+    _audio_sink: Optional[Callable[[np.ndarray], None]] = None
         
     def __init__(self, frame: "Frame"):
         """
@@ -26,14 +112,19 @@ class Microphone:
             frame (Frame): The Frame instance to associate with the Microphone.
         """
         self.frame = frame
-        self._audio_buffer = None
+        self._audio_sink = None
+        self._samples_remaining = 0
         self._bit_depth = 16
         self._sample_rate = 8000
         self._silence_threshold = 0.02
         self._audio_finished_event = asyncio.Event()
         self._seconds_per_packet = 0
         self._last_sound_time = 0
-        self._noise_floor = 0
+        self._noise_floor = 0.0
+        self._inverse_full_scale = _INVERSE_INT16_MAX
+        self._use_mulaw = False
+        self._receiving_mulaw = False
+        self._dropped_packet_count = 0
     
     @property
     def silence_threshold(self) -> float:
@@ -105,9 +196,39 @@ class Microphone:
             raise ValueError("Sample rate must be 8000 or 16000")
         self._sample_rate = value
 
+    @property
+    def use_mulaw(self) -> bool:
+        """
+        Get whether 16-bit audio is mu-law encoded for transfer from the Frame.
+
+        Returns:
+            bool: True if 16-bit audio is sent mu-law encoded.
+        """
+        return self._use_mulaw
+
+    @use_mulaw.setter
+    def use_mulaw(self, value: bool) -> None:
+        """
+        Set whether 16-bit audio is mu-law encoded for transfer from the Frame.  The default is False.  Mu-law sends each sample as a single byte, halving the bluetooth traffic, at the cost of some precision on louder samples, which is generally fine for speech.  Recorded audio is still returned as 16-bit samples.  This has no effect on 8-bit audio.
+
+        Args:
+            value (bool): True to mu-law encode 16-bit audio.
+        """
+        self._use_mulaw = value
+
+    @property
+    def dropped_packet_count(self) -> int:
+        """
+        Get the number of packets of audio the Frame dropped during the last recording because bluetooth couldn't keep up.  Each dropped packet leaves a short gap in the recording.
+
+        Returns:
+            int: The number of packets dropped.
+        """
+        return self._dropped_packet_count
+
     async def record_audio(self, silence_cutoff_length_in_seconds: Optional[int] = 3, max_length_in_seconds: int = 30) -> np.ndarray:
         """
-        Record audio from the microphone.
+        Record audio from the microphone.  If bluetooth can't keep up with the microphone, the Frame drops packets of audio, leaving short gaps in the recording; check `dropped_packet_count` afterwards to see how many.
 
         Args:
             silence_cutoff_length_in_seconds (int): The length of silence to allow before stopping the recording.  Defaults to 3 seconds, however you can set to None to disable silence detection.
@@ -116,13 +237,58 @@ class Microphone:
         Returns:
             np.ndarray: The recorded audio data.
         """
+        # allocate room for the whole recording up front so packets are copied straight into place
+        audio_buffer = np.empty(int(max_length_in_seconds * self.sample_rate), dtype=self._sample_dtype())
+        sample_count = await self.record_audio_into(audio_buffer, silence_cutoff_length_in_seconds, max_length_in_seconds)
+        return audio_buffer[:sample_count]
+
+    async def record_audio_into(self, buffer: Union[bytearray, memoryview, np.ndarray], silence_cutoff_length_in_seconds: Optional[int] = 3, max_length_in_seconds: int = 30) -> int:
+        """
+        Record audio from the microphone straight into a buffer you provide, such as a `bytearray` or numpy array, so you can reuse it across recordings.  Samples are written in the native byte order as int16 for 16-bit audio or int8 for 8-bit audio, so you can view the result with `np.frombuffer(buffer, dtype=np.int16)` (or `np.int8`) without copying.
+
+        Args:
+            buffer (Union[bytearray, memoryview, np.ndarray]): A writable buffer to record into.  Any audio beyond what fits in it is dropped.
+            silence_cutoff_length_in_seconds (int): The length of silence to allow before stopping the recording.  Defaults to 3 seconds, however you can set to None to disable silence detection.
+            max_length_in_seconds (int): The maximum length of the recording.  Defaults to 30 seconds.
+
+        Returns:
+            int: The number of samples recorded into the start of the buffer.
+        """
+        samples = np.frombuffer(buffer, dtype=self._sample_dtype())
+        write_position = 0
+
+        def write_to_buffer(audio_data: np.ndarray) -> None:
+            nonlocal write_position
+            samples[write_position:write_position + len(audio_data)] = audio_data
+            write_position += len(audio_data)
+
+        return await self._record(write_to_buffer, silence_cutoff_length_in_seconds, max_length_in_seconds, len(samples))
+
+    async def _record(self, sink: Callable[[np.ndarray], None], silence_cutoff_length_in_seconds: Optional[int], max_length_in_seconds: int, max_sample_count: Optional[int] = None) -> int:
+        """
+        Record audio from the microphone, handing each packet of samples to `sink` as it arrives.
+
+        Args:
+            sink (Callable[[np.ndarray], None]): Called with each packet of samples, in order.  Samples beyond `max_length_in_seconds` or `max_sample_count` are never passed on.
+            silence_cutoff_length_in_seconds (int): The length of silence to allow before stopping the recording, or None to disable silence detection.
+            max_length_in_seconds (int): The maximum length of the recording.
+            max_sample_count (Optional[int]): The maximum number of samples to pass on, if lower than `max_length_in_seconds` allows.
+
+        Returns:
+            int: The number of samples to keep from the start of the recording, which excludes the trailing silence if the recording ended on silence.
+        """
         await self.frame.run_lua("frame.microphone.stop()", checked=False)
 
-        self._audio_buffer = np.array([], dtype=np.int8 if self.bit_depth == 8 else np.int16)
+        if max_sample_count is None or max_sample_count > max_length_in_seconds * self.sample_rate:
+            max_sample_count = int(max_length_in_seconds * self.sample_rate)
+        self._samples_remaining = max_sample_count
+        self._audio_sink = sink
+        self._inverse_full_scale = _INVERSE_INT8_MAX if self.bit_depth == 8 else _INVERSE_INT16_MAX
+        self._receiving_mulaw = self.use_mulaw and self.bit_depth == 16
         self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.MIC_DATA, self._audio_buffer_handler)
         self._audio_finished_event.clear()
         
-        bytes_per_second = self.sample_rate * (self.bit_depth // 8)
+        bytes_per_second = self.sample_rate * (1 if self._receiving_mulaw else self.bit_depth // 8)
         seconds_per_byte = 1 / bytes_per_second
         self._seconds_per_packet = seconds_per_byte * (self.frame.bluetooth.max_data_payload() - 1)
         self._silence_cutoff_length_in_seconds = silence_cutoff_length_in_seconds
@@ -130,22 +296,39 @@ class Microphone:
         
         if self.frame.bluetooth.print_debugging:
             print(f"Starting audio recording at {self.sample_rate} Hz, {self.bit_depth}-bit")
-        await self.frame.bluetooth.send_lua(f"microphoneRecordAndSend({self.sample_rate},{self.bit_depth},nil)")
+        await self.frame.bluetooth.send_lua(f"microphoneRecordAndSend({self.sample_rate},{self.bit_depth},nil,{'true' if self._receiving_mulaw else 'false'})")
+        ended_on_silence = False
         try:
             await asyncio.wait_for(self._audio_finished_event.wait(), timeout=max_length_in_seconds)
             await self.frame.bluetooth.send_break_signal()
-            # Trim the final _silence_cutoff_length_in_seconds seconds
-            trim_length = (self._silence_cutoff_length_in_seconds - 0.5) * self._sample_rate
-            if len(self._audio_buffer) > trim_length:
-                self._audio_buffer = self._audio_buffer[:-int(trim_length)]
+            ended_on_silence = True
         except asyncio.TimeoutError:
             await self.frame.bluetooth.send_break_signal()
-        if self.frame.bluetooth.print_debugging:
-            print(f"\nAudio recording finished with {len(self._audio_buffer)/self._sample_rate:1.1f} seconds of audio")
         self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.MIC_DATA, None)
-        await self.frame.run_lua("frame.microphone.stop()")
+        self._audio_sink = None
+        sample_count = max_sample_count - self._samples_remaining
+
+        if ended_on_silence:
+            # Trim the final _silence_cutoff_length_in_seconds seconds
+            trim_length = (self._silence_cutoff_length_in_seconds - 0.5) * self._sample_rate
+            if sample_count > trim_length:
+                sample_count -= int(trim_length)
+        if self.frame.bluetooth.print_debugging:
+            print(f"\nAudio recording finished with {sample_count/self._sample_rate:1.1f} seconds of audio")
+        self._dropped_packet_count = int(await self.frame.run_lua("frame.microphone.stop();print(dropped_packet_count or 0)", await_print=True))
+        if self.frame.bluetooth.print_debugging and self._dropped_packet_count > 0:
+            print(f"{self._dropped_packet_count} audio packets were dropped")
         
-        return self._audio_buffer
+        return sample_count
+
+    def _sample_dtype(self) -> type:
+        """
+        Get the numpy dtype that recorded samples are returned as for the current bit depth.
+
+        Returns:
+            type: np.int8 or np.int16.
+        """
+        return np.int8 if self.bit_depth == 8 else np.int16
     
     async def save_audio_file(self, filename: str, silence_cutoff_length_in_seconds: int = 3, max_length_in_seconds: int = 30) -> float:
         """
@@ -159,28 +342,39 @@ class Microphone:
         Returns:
             float: The length of the recorded audio in seconds.
         """
-        audio_data = await self.record_audio(silence_cutoff_length_in_seconds, max_length_in_seconds)
+        dtype = self._sample_dtype()
+        peak_amplitude = 0
+        # stream the recording to a temporary file as it arrives rather than holding all of it in memory, keeping track of the peak as we go
+        with tempfile.TemporaryFile() as raw_file:
+            def write_to_file(audio_data: np.ndarray) -> None:
+                nonlocal peak_amplitude
+                peak_amplitude = max(peak_amplitude, _peak_amplitude(audio_data))
+                raw_file.write(audio_data)
+
+            sample_count = await self._record(write_to_file, silence_cutoff_length_in_seconds, max_length_in_seconds)
         
-        if len(audio_data) == 0:
-            raise ValueError("No audio data recorded")
-
-        # Normalize the 8 or 16 bit data range to (-1, 1) for playback
-        if self.bit_depth == 8:
-            audio_data = np.int16(audio_data)
-        
-        # based on the max and min values, normalize the data to be within the range of int16.min and int16.max.
-        real_range = int(np.max(audio_data)) - int(np.min(audio_data))
-        ideal_range = int(np.iinfo(np.int16).max) - int(np.iinfo(np.int16).min)
-        scale_factor = np.min([ideal_range / real_range, int(np.iinfo(np.int16).max) / np.max(audio_data), int(np.iinfo(np.int16).min) / np.min(audio_data)])
-        audio_data = (audio_data * scale_factor).astype(np.int16)
-
-        with wave.open(filename,"wb") as f:
-            f.setnchannels(1)
-            f.setsampwidth(16 // 8)
-            f.setframerate(self.sample_rate)
-            f.writeframes(audio_data.tobytes())
+            if sample_count == 0:
+                raise ValueError("No audio data recorded")
+
+            # based on the peak amplitude, normalize the data to be within the range of int16.min and int16.max.
+            scale_factor = np.iinfo(np.int16).max / max(peak_amplitude, 1)
+
+            raw_file.seek(0)
+            block = np.empty(min(sample_count, _SAVE_BLOCK_SAMPLES), dtype=np.int16)
+            with wave.open(filename,"wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(16 // 8)
+                f.setframerate(self.sample_rate)
+                remaining = sample_count
+                while remaining:
+                    block_length = min(remaining, len(block))
+                    audio_data = np.frombuffer(raw_file.read(block_length * np.dtype(dtype).itemsize), dtype=dtype)
+                    # scale straight into the int16 block, which also widens 8 bit data
+                    np.multiply(audio_data, scale_factor, out=block[:block_length], casting='unsafe')
+                    f.writeframes(block[:block_length].tobytes())
+                    remaining -= block_length
             
-        length_in_seconds = len(audio_data) / self.sample_rate
+        length_in_seconds = sample_count / self.sample_rate
         return length_in_seconds
     
     def _audio_buffer_handler(self, data: bytes) -> None:
@@ -190,25 +384,23 @@ class Microphone:
         Args:
             data (bytes): The incoming audio data.
         """
-        if self._audio_buffer is None:
+        if self._audio_sink is None:
             return
         
-        audio_data = self._convert_bytes_to_audio_data(data, self.bit_depth)
-        self._audio_buffer = np.concatenate((self._audio_buffer, audio_data))
+        if self._receiving_mulaw:
+            audio_data = _MULAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)]
+        else:
+            audio_data = self._convert_bytes_to_audio_data(data, self.bit_depth)
+        # anything beyond max_length_in_seconds is dropped
+        sample_count = min(len(audio_data), self._samples_remaining)
+        if sample_count > 0:
+            self._audio_sink(audio_data[:sample_count])
+            self._samples_remaining -= sample_count
         
         if self._silence_cutoff_length_in_seconds is not None:
-            min_amplitude = int(np.min(audio_data))
-            max_amplitude = int(np.max(audio_data))
-            delta = max_amplitude - min_amplitude
+            self._noise_floor, is_sound = _silence_step(audio_data, self._noise_floor, self._inverse_full_scale, self._silence_threshold)
             
-            if self._bit_depth == 8:
-                delta = float(delta / np.iinfo(np.int8).max)
-            elif self._bit_depth == 16:
-                delta = float(delta / np.iinfo(np.int16).max)
-            
-            self._noise_floor = self._noise_floor + (delta - self._noise_floor) * 0.1
-            
-            if delta - self._noise_floor > self._silence_threshold:
+            if is_sound:
                 self._last_sound_time = time.time()
                 if self.frame.bluetooth.print_debugging:
                     print("+", end="", flush=True)
@@ -230,9 +422,9 @@ class Microphone:
             np.ndarray: The converted audio data.
         """
         if bit_depth == 16:
-            audio_data = np.frombuffer(bytearray(audio_buffer), dtype=np.int16)
+            audio_data = np.frombuffer(audio_buffer, dtype=np.int16)
         elif bit_depth == 8:
-            audio_data = np.frombuffer(bytearray(audio_buffer), dtype=np.int8)
+            audio_data = np.frombuffer(audio_buffer, dtype=np.int8)
         else:
             raise ValueError("Unsupported bit depth")
         
@@ -255,14 +447,9 @@ class Microphone:
         if bit_depth is None:
             bit_depth = self.bit_depth
             
-        if bit_depth == 8:
-            # Normalize to 16-bit range
-            audio_data = audio_data.astype(np.int16)
-            np.multiply(audio_data, 32767 / np.max(np.abs(audio_data)), out=audio_data, casting='unsafe')
-        else:
-            # Normalize to 16-bit range
-            np.multiply(audio_data, 32767 / np.max(np.abs(audio_data)), out=audio_data, casting='unsafe')
-            audio_data = audio_data.astype(np.int16)
+        # Normalize to 16-bit range, scaling into a new int16 array so the caller's data is left untouched and only one array is allocated.
+        # silent audio has a peak of 0, so it is left as is rather than divided by zero
+        audio_data = np.multiply(audio_data, 32767 / max(_peak_amplitude(audio_data), 1), out=np.empty(len(audio_data), dtype=np.int16), casting='unsafe')
         return simpleaudio.play_buffer(audio_data, num_channels=1, bytes_per_sample=2, sample_rate=sample_rate)
     
     def play_audio(self, audio_data: np.ndarray, sample_rate: Optional[int] = None, bit_depth: Optional[int] = None) -> None:
@@ -287,5 +474,5 @@ class Microphone:
             bit_depth (Optional[int]): The bit depth of the audio data. Defaults to the instance's bit depth.
         """
         player = self.play_audio_background(audio_data, sample_rate, bit_depth)
-        while player.is_playing():
-            await asyncio.sleep(0.1)
\ No newline at end of file
+        # wait for playback to finish in a worker thread, so we resume as soon as it ends rather than on the next poll
+        await asyncio.get_running_loop().run_in_executor(None, player.wait_done)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from __future__ import annotations
 import math
+import struct
 from typing import Awaitable, Callable, Optional, TYPE_CHECKING, Tuple
 import asyncio
 
@@ -8,8 +9,18 @@ from .bluetooth import FrameDataTypePrefixes
 if TYPE_CHECKING:
     from .frame import Frame
 
+# each tap carries a one-byte sequence number so that a retransmitted notification isn't reported twice
+_TAP_LUA_SEND = "tap_seq=((tap_seq or 0)+1)%256;frame.bluetooth.send('\\x" + FrameDataTypePrefixes.TAP.value_as_hex + "'..string.char(tap_seq))"
+
+# roll, pitch and heading are sent as three little-endian floats rather than printed as text, so no string parsing is needed
+_DIRECTION_LUA = "local dir=frame.imu.direction();frame.bluetooth.send('\\x" + FrameDataTypePrefixes.IMU_DATA.value_as_hex + "'..string.pack('<fff',dir['roll'],dir['pitch'],dir['heading']))"
+_DIRECTION_STRUCT = struct.Struct("<fff")
+
 class Direction:
     """Represents a direction in 3D space."""
+
+    __slots__ = ("roll", "pitch", "heading")
+
     roll: float
     """
     The roll angle of the Frame in degrees.
@@ -83,22 +94,11 @@ class Direction:
         Returns:
             Direction: A new Direction object representing the sum of the two directions.
         """
-        new_roll = self.roll + other.roll
-        new_pitch = self.pitch + other.pitch
+        # Wrap roll and pitch to be within -180 to 180 degrees
+        new_roll = (self.roll + other.roll + 180.0) % 360.0 - 180.0
+        new_pitch = (self.pitch + other.pitch + 180.0) % 360.0 - 180.0
         new_heading = (self.heading + other.heading) % 360
 
-        # Clamp roll to be within -180 to 180 degrees
-        if new_roll > 180:
-            new_roll -= 360
-        elif new_roll < -180:
-            new_roll += 360
-            
-        # Clamp pitch to be within -180 to 180 degrees
-        if new_pitch > 180:
-            new_pitch -= 360
-        elif new_pitch < -180:
-            new_pitch += 360
-
         return Direction(
             roll=new_roll,
             pitch=new_pitch,
@@ -115,22 +115,11 @@ class Direction:
         Returns:
             Direction: A new Direction object representing the difference between the two directions.
         """
-        new_roll = self.roll - other.roll
-        new_pitch = self.pitch - other.pitch
+        # Wrap roll and pitch to be within -180 to 180 degrees
+        new_roll = (self.roll - other.roll + 180.0) % 360.0 - 180.0
+        new_pitch = (self.pitch - other.pitch + 180.0) % 360.0 - 180.0
         new_heading = (self.heading - other.heading) % 360
 
-        # Clamp roll to be within -180 to 180 degrees
-        if new_roll > 180:
-            new_roll -= 360
-        elif new_roll < -180:
-            new_roll += 360
-            
-        # Clamp pitch to be within -180 to 180 degrees
-        if new_pitch > 180:
-            new_pitch -= 360
-        elif new_pitch < -180:
-            new_pitch += 360
-
         return Direction(
             roll=new_roll,
             pitch=new_pitch,
@@ -150,6 +139,7 @@ class Motion:
     """Handle motion on the Frame IMU."""
 
     frame: "Frame" = None
+    _last_tap_seq: Optional[int] = None
         
     def __init__(self, frame: "Frame"):
         """
@@ -162,27 +152,47 @@ class Motion:
     
     async def get_direction(self) -> Direction:
         """Gets the orientation of the Frame.  Note that the `heading` is not yet implemented"""
-        result = await self.frame.run_lua("local dir = frame.imu.direction();print(dir['roll']..','..dir['pitch']..','..dir['heading'])", await_print=True)
-        result = result.split(",")
-        direction = Direction(roll=float(result[0]), pitch=float(result[1]), heading=float(result[2]))
+        direction_received = asyncio.get_running_loop().create_future()
+        def on_direction_data(data: bytes) -> None:
+            if not direction_received.done():
+                direction_received.set_result(data)
+        
+        self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.IMU_DATA, on_direction_data)
+        try:
+            await self.frame.run_lua(_DIRECTION_LUA, checked=True)
+            timeout = self.frame.bluetooth.default_timeout
+            try:
+                data = await asyncio.wait_for(direction_received, timeout)
+            except asyncio.TimeoutError:
+                raise Exception(f"Frame didn't respond with its direction within {timeout} seconds")
+        finally:
+            self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.IMU_DATA, None)
         
-        return direction
+        roll, pitch, heading = _DIRECTION_STRUCT.unpack_from(data)
+        return Direction(roll=roll, pitch=pitch, heading=heading)
     
     
     async def run_on_tap(self, lua_script: Optional[str] = None, callback: Optional[Callable[[], None]] = None) -> None:
         """Run a callback when the Frame is tapped.  Can include lua code to be run on Frame upon tap and/or a python callback to be run locally upon tap."""
         
+        self._last_tap_seq = None
         if callback is not None:
-            self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.TAP, callback)
+            def on_tap_data(data: bytes) -> None:
+                if len(data) > 0:
+                    if data[0] == self._last_tap_seq:
+                        return
+                    self._last_tap_seq = data[0]
+                callback()
+            self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.TAP, on_tap_data)
         else:
             self.frame.bluetooth.register_data_response_handler(FrameDataTypePrefixes.TAP, None)
         
         if lua_script is not None and callback is not None:
-            await self.frame.run_lua("function on_tap();frame.bluetooth.send('\\x"+FrameDataTypePrefixes.TAP.value_as_hex+"');"+lua_script+";end;frame.imu.tap_callback(on_tap)", checked=True)
+            await self.frame.run_lua(f"function on_tap();{_TAP_LUA_SEND};{lua_script};end;frame.imu.tap_callback(on_tap)", checked=True)
         elif lua_script is None and callback is not None:
-            await self.frame.run_lua("function on_tap();frame.bluetooth.send('\\x"+FrameDataTypePrefixes.TAP.value_as_hex+"');end;frame.imu.tap_callback(on_tap)", checked=True)
+            await self.frame.run_lua(f"function on_tap();{_TAP_LUA_SEND};end;frame.imu.tap_callback(on_tap)", checked=True)
         elif lua_script is not None and callback is None:
-            await self.frame.run_lua("function on_tap();"+lua_script+";end;frame.imu.tap_callback(on_tap)", checked=True)
+            await self.frame.run_lua(f"function on_tap();{lua_script};end;frame.imu.tap_callback(on_tap)", checked=True)
         else:
             await self.frame.run_lua("frame.imu.tap_callback(nil)", checked=False)
     
@@ -0,0 +1,22 @@
+import os
+import unittest
+
+from frame_sdk import Frame
+
+def remove_if_exists(path):
+    """Delete a file a test saved, if it got as far as saving it"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+class FrameTestCase(unittest.IsolatedAsyncioTestCase):
+    """A test case that connects to the Frame before each test as `self.f`, and disconnects after it"""
+
+    async def asyncSetUp(self):
+        # each test runs on its own event loop, so the connection can't outlive a single test
+        self.f = Frame()
+        await self.f.__aenter__()
+
+    async def asyncTearDown(self):
+        await self.f.__aexit__(None, None, None)
@@ -1,6 +1,5 @@
 import unittest
 import asyncio
-import sys
 
 from frame_sdk import Bluetooth, Frame
 
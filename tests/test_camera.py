@@ -1,75 +1,67 @@
 import os
 import unittest
-import asyncio
-import sys
 import time
 
-from frame_sdk import Frame
+from frame_test_case import FrameTestCase, remove_if_exists
 from frame_sdk.camera import AutofocusType, Quality
 
-class TestCamera(unittest.IsolatedAsyncioTestCase):
+def _size(photo):
+    """The size of a photo in bytes, whether it comes back as bytes, a bytearray or a memoryview"""
+    return photo.nbytes if isinstance(photo, memoryview) else len(photo)
+
+class TestCamera(FrameTestCase):
     async def test_get_photo(self):
         """
         Test taking a photo
         """
-        async with Frame() as f:
-            photo = await f.camera.take_photo()
-            self.assertGreater(len(photo), 2000)
-            
+        photo = await self.f.camera.take_photo()
+        self.assertGreater(_size(photo), 2000)
+        
     async def test_save_photo_to_disk(self):
         """
         Test saving a photo to disk
         """
-        async with Frame() as f:
-            await f.camera.save_photo("test_photo.jpg")
-            self.assertTrue(os.path.exists("test_photo.jpg"))
-            self.assertGreater(os.path.getsize("test_photo.jpg"), 2000)
-            os.remove("test_photo.jpg")
-            
+        self.addCleanup(remove_if_exists, "test_photo.jpg")
+        await self.f.camera.save_photo("test_photo.jpg")
+        # os.stat() raises FileNotFoundError if the file wasn't saved, so this checks it exists too
+        self.assertGreater(os.stat("test_photo.jpg").st_size, 2000)
+        
     async def test_photo_with_autofocus_options(self):
         """
         Test taking a photo with various autofocus options
         """
-        async with Frame() as f:
-
-            startTime = time.time()
-            photo = await f.camera.take_photo(autofocus_seconds=None)
-            endTime = time.time()
-            self.assertGreater(len(photo), 2000)
-            timeToTakePhotoWithoutAutoFocus = endTime - startTime
-
-            startTime = time.time()
-            photo = await f.camera.take_photo(autofocus_seconds=1, autofocus_type=AutofocusType.SPOT)
-            endTime = time.time()
-            self.assertGreater(len(photo), 2000)
-            timeToTakePhotoWithAutoFocus1Sec = endTime - startTime
+        async def take_timed_photo(**kwargs):
+            start_ns = time.monotonic_ns()
+            photo = await self.f.camera.take_photo(**kwargs)
+            return _size(photo), time.monotonic_ns() - start_ns
 
-            self.assertGreater(timeToTakePhotoWithAutoFocus1Sec, timeToTakePhotoWithoutAutoFocus)
-            
-            startTime = time.time()
-            photo = await f.camera.take_photo(autofocus_seconds=3, autofocus_type=AutofocusType.CENTER_WEIGHTED)
-            endTime = time.time()
-            self.assertGreater(len(photo), 2000)
-            timeToTakePhotoWithAutoFocus3Sec = endTime - startTime
+        # taken one after another rather than gathered, since the Frame captures one photo at a time and overlapping captures would time the queueing rather than the autofocus
+        results = [
+            await take_timed_photo(autofocus_seconds=None),
+            await take_timed_photo(autofocus_seconds=1, autofocus_type=AutofocusType.SPOT),
+            await take_timed_photo(autofocus_seconds=3, autofocus_type=AutofocusType.CENTER_WEIGHTED),
+        ]
 
-            self.assertGreater(timeToTakePhotoWithAutoFocus3Sec, timeToTakePhotoWithAutoFocus1Sec)
+        for photo_size, _ in results:
+            self.assertGreater(photo_size, 2000)
+        for (_, shorter_autofocus_ns), (_, longer_autofocus_ns) in zip(results, results[1:]):
+            self.assertGreater(longer_autofocus_ns, shorter_autofocus_ns)
 
     async def test_photo_with_quality_options(self):
         """
         Test taking a photo with various quality options
         """
-        async with Frame() as f:
-            photo = await f.camera.take_photo(quality=Quality.LOW)
-            low_quality_size = len(photo)
-            self.assertGreater(low_quality_size, 2000)
+        # these can't be gathered: the Frame captures one photo at a time, and each photo is matched to its request through a single shared data response
+        qualities = (Quality.LOW, Quality.MEDIUM, Quality.HIGH)
+        photo_sizes = []
+        for quality in qualities:
+            photo = await self.f.camera.take_photo(quality=quality)
+            photo_sizes.append(_size(photo))
 
-            photo = await f.camera.take_photo(quality=Quality.MEDIUM)
-            medium_quality_size = len(photo)
-            self.assertGreater(medium_quality_size, low_quality_size)
-            
-            photo = await f.camera.take_photo(quality=Quality.HIGH)
-            high_quality_size = len(photo)
-            self.assertGreater(high_quality_size, medium_quality_size)
+        self.assertGreater(photo_sizes[0], 2000)
+        for i in range(1, len(qualities)):
+            with self.subTest(quality=qualities[i]):
+                self.assertGreater(photo_sizes[i], photo_sizes[i - 1])
 
 
 
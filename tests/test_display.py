@@ -1,6 +1,4 @@
 import unittest
-import asyncio
-import sys
 import time
 
 from frame_sdk import Frame
@@ -1,6 +1,4 @@
 import unittest
-import asyncio
-import sys
 
 from frame_sdk import Frame
 
@@ -3,7 +3,6 @@ import asyncio
 import time
 
 from frame_sdk import Frame
-from frame_sdk.camera import Quality
 
 class TestFrame(unittest.IsolatedAsyncioTestCase):
     async def test_send_lua(self):
@@ -1,75 +1,96 @@
 import os
 import unittest
 import asyncio
-import sys
 import time
 import numpy as np
 
-from frame_sdk import Frame
+from frame_test_case import FrameTestCase, remove_if_exists
+
+_INT16_MAX = np.iinfo(np.int16).max
+_INT16_MIN = np.iinfo(np.int16).min
+_INT8_MAX = np.iinfo(np.int8).max
+_INT8_MIN = np.iinfo(np.int8).min
+
+def _sine_wave(sample_rate, bit_depth, seconds=5, frequency=440):
+    """A half-scale sine wave to play back, in place of a real recording"""
+    dtype = np.int16 if bit_depth == 16 else np.int8
+    t = np.arange(sample_rate * seconds) / sample_rate
+    return (np.sin(2 * np.pi * frequency * t) * 0.5 * np.iinfo(dtype).max).astype(dtype)
+
+class TestMicrophone(FrameTestCase):
+    def _assert_plausible_recording(self, audio_data, sample_rate, dtype_min, dtype_max, min_range):
+        """Check a 5 second recording has about the right number of samples, all in range, and isn't flat"""
+        self.assertAlmostEqual(len(audio_data), 5 * sample_rate, delta=4000)
+        low, high = int(audio_data.min()), int(audio_data.max())
+        self.assertLessEqual(high, dtype_max)
+        self.assertGreaterEqual(low, dtype_min)
+        self.assertGreater(high - low, min_range)
+
+    async def test_basic_audio_recording_8khz_16bit(self):
+        self.f.microphone.sample_rate = 8000
+        self.f.microphone.bit_depth = 16
+        buffer = bytearray(5 * 8000 * 2)
+        sample_count = await self.f.microphone.record_audio_into(buffer, None, 5)
+        audio_data = np.frombuffer(buffer, dtype=np.int16)[:sample_count]
+        self._assert_plausible_recording(audio_data, 8000, _INT16_MIN, _INT16_MAX, 50)
+
+    async def test_basic_audio_recording_16khz_8bit(self):
+        self.f.microphone.sample_rate = 16000
+        self.f.microphone.bit_depth = 8
+        buffer = bytearray(5 * 16000)
+        sample_count = await self.f.microphone.record_audio_into(buffer, None, 5)
+        audio_data = np.frombuffer(buffer, dtype=np.int8)[:sample_count]
+        self._assert_plausible_recording(audio_data, 16000, _INT8_MIN, _INT8_MAX, 5)
+
+    async def test_mulaw_audio_recording(self):
+        self.f.microphone.sample_rate = 8000
+        self.f.microphone.bit_depth = 16
+        self.f.microphone.use_mulaw = True
+        audio_data = await self.f.microphone.record_audio(None, 5)
+        # mu-law is only used for the transfer, so the samples still come back as 16-bit
+        self.assertEqual(audio_data.dtype, np.int16)
+        self._assert_plausible_recording(audio_data, 8000, _INT16_MIN, _INT16_MAX, 50)
 
-class TestMicrophone(unittest.IsolatedAsyncioTestCase):
-    async def test_basic_audio_recording(self):
-        async with Frame() as f:
-            f.microphone.sample_rate = 8000
-            f.microphone.bit_depth = 16
-            audio_data = await f.microphone.record_audio(None, 5)
-            self.assertAlmostEqual(len(audio_data), 5 * 8000, delta=4000)
-            self.assertLessEqual(np.max(audio_data), np.iinfo(np.int16).max)
-            self.assertGreaterEqual(np.min(audio_data), np.iinfo(np.int16).min)
-            self.assertGreater(abs(int(np.max(audio_data)) - int(np.min(audio_data))), 50)
-            
-            f.microphone.sample_rate = 16000
-            f.microphone.bit_depth = 8
-            audio_data = await f.microphone.record_audio(None, 5)
-            self.assertAlmostEqual(len(audio_data), 5 * 16000, delta=4000)
-            self.assertLessEqual(np.max(audio_data), np.iinfo(np.int8).max)
-            self.assertGreaterEqual(np.min(audio_data), np.iinfo(np.int8).min)
-            self.assertGreater(abs(int(np.max(audio_data)) - int(np.min(audio_data))), 5)
-    
     async def test_end_on_silence(self):
-        async with Frame() as f:
-            f.microphone.sample_rate = 8000
-            f.microphone.bit_depth = 16
-            await f.display.show_text("Testing microphone, please be silent!")
-            audio_data = await f.microphone.record_audio(2, 20)
-            await f.display.clear()
-            self.assertLess(len(audio_data), 5 * 8000)
+        self.f.microphone.sample_rate = 8000
+        self.f.microphone.bit_depth = 16
+        await self.f.display.show_text("Testing microphone, please be silent!")
+        # the 20 second limit should never be reached, so fail outright rather than wait it out if silence isn't detected
+        audio_data = await asyncio.wait_for(self.f.microphone.record_audio(2, 20), timeout=25)
+        await self.f.display.clear()
+        # 2 seconds of silence ends the recording and the last 1.5 seconds of it are trimmed, so anything longer means the end was detected late
+        self.assertLess(len(audio_data) / self.f.microphone.sample_rate, 2.5)
     
     async def test_save_audio(self):
-        async with Frame() as f:
-            f.microphone.sample_rate = 8000
-            f.microphone.bit_depth = 16
-            await f.display.show_text("Testing microphone, please be silent!")
-            length = await f.microphone.save_audio_file("test.wav",2,20)
-            await f.display.clear()
-            self.assertLess(length, 5)
-            self.assertTrue(os.path.exists("test.wav"))
-            self.assertGreater(os.path.getsize("test.wav"), 500)
-            os.remove("test.wav")
-            
-    async def test_record_and_play_audio(self):
-        async with Frame() as f:
-            for sample_rate in [8000, 16000]:
-                for bit_depth in [8, 16]:
-                    if sample_rate == 16000 and bit_depth == 16:
-                        continue
-                    f.microphone.sample_rate = sample_rate
-                    f.microphone.bit_depth = bit_depth
-                    data = await f.microphone.record_audio(None, 5)
-                    start_time = time.time()
-                    f.microphone.play_audio(data)
-                    end_time = time.time()
-                    self.assertAlmostEqual(end_time - start_time, 5, delta=0.5)
-                    self.assertAlmostEqual(end_time - start_time, len(data) / f.microphone.sample_rate, delta=0.2)
-                    start_time = time.time()
-                    await f.microphone.play_audio_async(data)
-                    end_time = time.time()
-                    self.assertAlmostEqual(end_time - start_time, len(data) / f.microphone.sample_rate, delta=0.2)
-                    start_time = time.time()
-                    f.microphone.play_audio_background(data)
-                    end_time = time.time()
-                    self.assertAlmostEqual(end_time - start_time, 0, delta=0.1)
-
+        self.f.microphone.sample_rate = 8000
+        self.f.microphone.bit_depth = 16
+        await self.f.display.show_text("Testing microphone, please be silent!")
+        self.addCleanup(remove_if_exists, "test.wav")
+        length = await self.f.microphone.save_audio_file("test.wav",2,20)
+        await self.f.display.clear()
+        self.assertLess(length, 5)
+        self.assertGreater(os.stat("test.wav").st_size, 500)
+        
+    async def test_play_audio(self):
+        mic = self.f.microphone
+        for sample_rate, bit_depth in ((8000, 8), (8000, 16), (16000, 8)):
+            with self.subTest(sample_rate=sample_rate, bit_depth=bit_depth):
+                mic.sample_rate = sample_rate
+                mic.bit_depth = bit_depth
+                data = _sine_wave(sample_rate, bit_depth)
+                start_time = time.monotonic()
+                mic.play_audio(data)
+                end_time = time.monotonic()
+                self.assertAlmostEqual(end_time - start_time, 5, delta=0.5)
+                self.assertAlmostEqual(end_time - start_time, len(data) / mic.sample_rate, delta=0.2)
+                start_time = time.monotonic()
+                await mic.play_audio_async(data)
+                end_time = time.monotonic()
+                self.assertAlmostEqual(end_time - start_time, len(data) / mic.sample_rate, delta=0.2)
+                start_time = time.monotonic()
+                mic.play_audio_background(data)
+                end_time = time.monotonic()
+                self.assertAlmostEqual(end_time - start_time, 0, delta=0.1)
 
 
 if __name__ == "__main__":